@@ -0,0 +1,233 @@
+'''Time wrap, place and render for each layout variant on random trees.
+
+    python benchmark.py --depth 4 --fanout 6 --variants refactoring \
+        --count-calls --output results.json
+
+Every variant lays out the same randomly generated tree. Each repetition
+builds the tree afresh outside the timer (so cached sizes cannot carry
+over) and then times `wrap()`, `place()` and `render()` separately; the
+best run of each phase is kept. With `--count-calls`, one more run counts
+the calls to `get_width` and `get_height` in each phase. Each phase is
+run on its own: if a variant cannot wrap, `place()` and `render()` are
+timed on the same tree built from `Placed*` cells instead. Only a phase
+that a variant cannot run at all is recorded with its error.
+'''
+
+import argparse
+import importlib
+import json
+import platform
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+# The constructors of each variant that take their children as separate
+# arguments; the others take a single list. Variants that can only render
+# `Rendered*` cells rebuild the tree from those classes for `render()`.
+VARIANTS = {
+    "refactoring": {"spread": {"PlacedRow", "PlacedCol", "WrappedRow", "WrappedCol"}},
+    "recycling": {"spread": {"WrappedRow"}},
+    "remove_spreading": {"spread": set()},
+    "rendering_a_clear_background": {"spread": {"WrappedRow"}, "rendered": True},
+}
+
+PHASES = ["wrap", "place", "render"]
+
+
+def make_spec(depth, fanout, max_size, seed=0):
+    """Generate a random tree as nested tuples so every variant gets the same one.
+
+    A spec is ("block", width, height), ("col", children) or
+    ("row", width, children); a row's width is between 30% and 100% of
+    the width of its children side by side, so most rows wrap.
+    """
+    rng = random.Random(seed)
+
+    def generate(level):
+        if level == depth:
+            return (("block", rng.randint(1, max_size), rng.randint(1, max_size)), max_size)
+        children = [generate(level + 1) for _ in range(rng.randint(1, fanout))]
+        specs = [c[0] for c in children]
+        if rng.random() < 0.5:
+            return (("col", specs), max(c[1] for c in children))
+        natural = sum(c[1] for c in children)
+        width = max(1, int(natural * rng.uniform(0.3, 1.0)))
+        return (("row", width, specs), width)
+
+    return generate(0)[0]
+
+
+def count_cells(spec):
+    if spec[0] == "block":
+        return 1
+    return 1 + sum(count_cells(c) for c in spec[-1])
+
+
+def build(module, style, spec, family="Wrapped"):
+    """Turn a spec into `Wrapped*`, `Placed*` or `Rendered*` cells of one variant
+
+    Only wrapped rows keep their width; the others size to their children.
+    """
+    kind = spec[0]
+    if kind == "block":
+        return getattr(module, family + "Block")(spec[1], spec[2])
+    children = [build(module, style, c, family) for c in spec[-1]]
+    name = family + ("Row" if kind == "row" else "Col")
+    args = (spec[1],) if name == "WrappedRow" else ()
+    if name in style["spread"]:
+        return getattr(module, name)(*args, *children)
+    return getattr(module, name)(*args, children)
+
+
+def phase_input(module, style, spec, phase):
+    """Build, outside any timer, a fresh tree for `phase` to work on"""
+    if phase == "wrap":
+        return build(module, style, spec)
+    if phase == "render" and style.get("rendered"):
+        return build(module, style, spec, "Rendered")
+    try:
+        return build(module, style, spec).wrap()
+    except Exception:
+        return build(module, style, spec, "Placed")
+
+
+PHASE_OPS = {
+    "wrap": lambda module, tree: tree.wrap(),
+    "place": lambda module, tree: tree.place(0, 0),
+    "render": lambda module, tree: module.render(tree),
+}
+
+
+def run_phases(module, style, spec):
+    """Return {phase: seconds or exception}, each phase on a tree of its own"""
+    results = {}
+    for phase in PHASES:
+        try:
+            tree = phase_input(module, style, spec, phase)
+            start = time.perf_counter()
+            PHASE_OPS[phase](module, tree)
+            results[phase] = time.perf_counter() - start
+        except Exception as exc:
+            results[phase] = exc
+    return results
+
+
+class CallCounter:
+    """Count calls to get_width and get_height while `active` is true"""
+    def __init__(self):
+        self.active = False
+        self.counts = {"get_width": 0, "get_height": 0}
+
+    def wrap(self, method, name):
+        def wrapper(cell):
+            if self.active:
+                self.counts[name] += 1
+            return method(cell)
+        return wrapper
+
+
+@contextmanager
+def instrumented(module, counter):
+    """Route get_width and get_height of every class in `module` through `counter`"""
+    patched = []
+    for cls in vars(module).values():
+        if not isinstance(cls, type) or cls.__module__ != module.__name__:
+            continue
+        for name in ("get_width", "get_height"):
+            if name in vars(cls):
+                original = vars(cls)[name]
+                setattr(cls, name, counter.wrap(original, name))
+                patched.append((cls, name, original))
+    try:
+        yield counter
+    finally:
+        for (cls, name, original) in patched:
+            setattr(cls, name, original)
+
+
+def count_phase(module, style, spec, phase):
+    """Return the get_width/get_height calls made by `phase` alone on a fresh tree"""
+    counter = CallCounter()
+    with instrumented(module, counter):
+        tree = phase_input(module, style, spec, phase)
+        counter.active = True
+        PHASE_OPS[phase](module, tree)
+    return counter.counts
+
+
+def measure(name, spec, repeat, calls):
+    style = VARIANTS[name]
+    module = importlib.import_module(name)
+    best = {}
+    for _ in range(repeat):
+        for (phase, value) in run_phases(module, style, spec).items():
+            if isinstance(value, Exception):
+                best[phase] = value
+            elif not isinstance(best.get(phase), Exception):
+                best[phase] = value if phase not in best else min(best[phase], value)
+
+    results = []
+    for phase in PHASES:
+        entry = {"variant": name, "phase": phase}
+        if isinstance(best[phase], Exception):
+            entry["error"] = f"{type(best[phase]).__name__}: {best[phase]}"
+        else:
+            entry["seconds"] = best[phase]
+            if calls:
+                entry["calls"] = count_phase(module, style, spec, phase)
+        results.append(entry)
+    return results
+
+
+def run(depth, fanout, max_size, repeat, variants, calls, seed=0):
+    spec = make_spec(depth, fanout, max_size, seed)
+    results = []
+    for name in variants:
+        results.extend(measure(name, spec, repeat, calls))
+    return {
+        "config": {"depth": depth, "fanout": fanout, "max_size": max_size,
+                   "cells": count_cells(spec), "repeat": repeat, "seed": seed},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def report(data):
+    for r in data["results"]:
+        if "error" in r:
+            print(f"{r['variant']:30} {r['phase']:8} error: {r['error']}")
+            continue
+        line = f"{r['variant']:30} {r['phase']:8} {r['seconds'] * 1e3:10.3f} ms"
+        if "calls" in r:
+            line += f" {r['calls']['get_width']:10} width {r['calls']['get_height']:10} height"
+        print(line)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--max-size", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variants", help="comma-separated subset of " + ",".join(VARIANTS))
+    parser.add_argument("--count-calls", action="store_true",
+                        help="also count get_width/get_height calls per phase")
+    parser.add_argument("--output", help="save results as JSON")
+    options = parser.parse_args(args)
+
+    variants = options.variants.split(",") if options.variants else list(VARIANTS)
+    assert all(v in VARIANTS for v in variants), f"Variants must be among {list(VARIANTS)}"
+    data = run(options.depth, options.fanout, options.max_size, options.repeat,
+               variants, options.count_calls, options.seed)
+    report(data)
+
+    if options.output:
+        with open(options.output, "w") as writer:
+            json.dump(data, writer, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,152 @@
+from array import array
+
+from refactoring import Block, Col, Row, make_screen, next_fill
+
+BLOCK = 0
+ROW = 1
+COL = 2
+KIND_NAMES = {BLOCK: "block", ROW: "row", COL: "col"}
+
+
+class FlatLayout:
+    """A layout tree stored as parallel arrays instead of one object per cell.
+
+    Node `i` is described by `kind[i]`, `parent[i]`, `first_child[i]`,
+    `next_sibling[i]`, `width[i]`, `height[i]`, `x0[i]` and `y0[i]`; -1
+    means "no such node". Node 0 is the root. A child is always added
+    after its parent and after its earlier siblings, so walking the
+    arrays backwards visits children before parents and walking forwards
+    visits parents (and earlier siblings) first. That is all `place`
+    needs to size the tree in one backward pass and position it in one
+    forward pass.
+    """
+    def __init__(self):
+        self.kind = array("b")
+        self.parent = array("q")
+        self.first_child = array("q")
+        self.last_child = array("q")
+        self.next_sibling = array("q")
+        self.width = array("q")
+        self.height = array("q")
+        self.x0 = array("q")
+        self.y0 = array("q")
+
+    def __len__(self):
+        return len(self.kind)
+
+    def add_block(self, width, height, parent=-1):
+        assert width >= 0 and height >= 0, "Need non-negative size"
+        return self._add(BLOCK, parent, width, height)
+
+    def add_row(self, parent=-1):
+        return self._add(ROW, parent)
+
+    def add_col(self, parent=-1):
+        return self._add(COL, parent)
+
+    def _add(self, kind, parent, width=0, height=0):
+        node = len(self.kind)
+        if parent < 0:
+            assert node == 0, "Only the first node can be the root"
+        else:
+            assert parent < node and self.kind[parent] != BLOCK, "Parent must be a row or column"
+            if self.first_child[parent] < 0:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[self.last_child[parent]] = node
+            self.last_child[parent] = node
+        self.kind.append(kind)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        self.width.append(width)
+        self.height.append(height)
+        self.x0.append(0)
+        self.y0.append(0)
+        return node
+
+    @classmethod
+    def from_cell(cls, root):
+        """Copy a tree of blocks, rows and columns (wrap it first if needed)"""
+        layout = cls()
+        stack = [(root, -1)]
+        while stack:
+            (cell, parent) = stack.pop()
+            if isinstance(cell, Block):
+                layout.add_block(cell.width, cell.height, parent)
+                continue
+            if isinstance(cell, Row):
+                node = layout.add_row(parent)
+            else:
+                assert isinstance(cell, Col), f"Unknown cell type {type(cell)}"
+                node = layout.add_col(parent)
+            stack.extend((c, node) for c in reversed(cell.children))
+        return layout
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def place(self):
+        """Size every node bottom-up, then position every node top-down"""
+        (kind, parent, width, height) = (self.kind, self.parent, self.width, self.height)
+        n = len(kind)
+        for i in range(n):
+            if kind[i] != BLOCK:
+                width[i] = height[i] = 0
+        for i in range(n - 1, 0, -1):
+            p = parent[i]
+            if kind[p] == ROW:
+                width[p] += width[i]
+                height[p] = max(height[p], height[i])
+            else:
+                width[p] = max(width[p], width[i])
+                height[p] += height[i]
+
+        (x0, y0) = (self.x0, self.y0)
+        # Where the next child of each row (x) or column (y) goes.
+        cursor = array("q", bytes(8 * n))
+        for i in range(n):
+            p = parent[i]
+            if p < 0:
+                x0[i] = y0[i] = 0
+            elif kind[p] == ROW:
+                x0[i] = cursor[p]
+                y0[i] = y0[p] + height[p] - height[i]
+                cursor[p] += width[i]
+            else:
+                x0[i] = x0[p]
+                y0[i] = cursor[p]
+                cursor[p] += height[i]
+            cursor[i] = x0[i] if kind[i] == ROW else y0[i]
+
+    def report(self, node=0):
+        result = [
+            KIND_NAMES[self.kind[node]],
+            self.x0[node], self.y0[node],
+            self.x0[node] + self.width[node], self.y0[node] + self.height[node],
+        ]
+        if self.kind[node] != BLOCK:
+            result.extend(self.report(c) for c in self.children(node))
+        return result
+
+    def render(self):
+        """Place the tree and draw it exactly as `refactoring.render` would"""
+        if not len(self):
+            return ""
+        self.place()
+        screen = make_screen(self.width[0], self.height[0])
+        fill = None
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            fill = next_fill(fill)
+            (x0, y0, w) = (self.x0[node], self.y0[node], self.width[node])
+            line = [fill] * w
+            for y in range(y0, y0 + self.height[node]):
+                screen[y][x0:x0 + w] = line
+            stack.extend(reversed(list(self.children(node))))
+        return "\n".join("".join(ch) for ch in screen)
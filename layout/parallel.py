@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from refactoring import Col, Row, draw, make_screen, next_fill
+
+
+def parallel_render(root, workers=None, tiles_per_worker=4):
+    """Render like `refactoring.render`, laying out and drawing subtrees in a process pool.
+
+    Once sizes are known, sibling subtrees can be placed and drawn
+    independently. The chain of single-child containers at the top is
+    drawn here; the children of the first container with more than one
+    are sent to workers in batches, each placed at (0, 0) and drawn into
+    a tile of its own size, and the tiles are copied into the screen at
+    the children's positions. Fills continue the same sequence `draw`
+    uses, so the result is identical to `render(root)`. Workers also send
+    back where they placed each cell, so like `render` this leaves the
+    whole tree placed.
+    """
+    workers = workers or os.cpu_count()
+    screen = make_screen(root.get_width(), root.get_height())
+    node = root
+    node.move_to(0, 0)
+    fill = next_fill(None)
+    place_children(node)
+    node.render(screen, fill)
+    while isinstance(node, (Row, Col)) and len(node.children) == 1:
+        node = node.children[0]
+        fill = next_fill(fill)
+        place_children(node)
+        node.render(screen, fill)
+
+    children = list(getattr(node, "children", []))
+    if children:
+        # Each child starts from the fill after the last one used by the
+        # cells before it.
+        starts = []
+        for child in children:
+            starts.append(fill)
+            for _ in range(count_cells(child)):
+                fill = next_fill(fill)
+        tasks = list(zip(children, starts))
+        size = max(1, -(-len(tasks) // (workers * tiles_per_worker)))
+        batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+        with ProcessPoolExecutor(workers) as pool:
+            results = pool.map(render_tiles, batches)
+            tiles = [tile for batch in results for tile in batch]
+        for (child, (tile, positions)) in zip(children, tiles):
+            for (i, line) in enumerate(tile):
+                screen[child.y0 + i][child.x0:child.x0 + len(line)] = line
+            (x_offset, y_offset) = (child.x0, child.y0)
+            for (cell, (x0, y0)) in zip(preorder(child), positions):
+                cell.move_to(x0 + x_offset, y0 + y_offset)
+    return "\n".join("".join(ch) for ch in screen)
+
+
+def place_children(node):
+    """Position the children of a placed node without placing their subtrees"""
+    if isinstance(node, Row):
+        y1 = node.y0 + node.get_height()
+        x_current = node.x0
+        for child in node.children:
+            child.move_to(x_current, y1 - child.get_height())
+            x_current += child.get_width()
+    elif isinstance(node, Col):
+        y_current = node.y0
+        for child in node.children:
+            child.move_to(node.x0, y_current)
+            y_current += child.get_height()
+
+
+def count_cells(node):
+    return sum(1 for _ in preorder(node))
+
+
+def preorder(node):
+    """Yield the cells of a subtree in the order `draw` visits them"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(getattr(node, "children", [])))
+
+
+def render_tiles(batch):
+    """Worker: place and draw each (subtree, previous fill) pair into its own tile.
+
+    Each result is the tile's lines and the position of every cell of the
+    subtree, in preorder, relative to the tile.
+    """
+    return [render_tile(node, fill) for (node, fill) in batch]
+
+
+def render_tile(node, fill):
+    node.place(0, 0)
+    screen = make_screen(node.get_width(), node.get_height())
+    draw(screen, node, fill)
+    positions = [(cell.x0, cell.y0) for cell in preorder(node)]
+    return (["".join(row) for row in screen], positions)
@@ -5,11 +5,79 @@
 # something similar to check style. `ruff check --fix .` will both
 # check style and do simple repairs.
 
+import weakref
+
+
 class Cell:
+    # Every cell starts out unplaced. Cached sizes and placement are kept
+    # until `mark_dirty` throws them away.
+    _dirty = True
+    _size = None
+
+    @property
+    def owners(self):
+        """The containers holding this cell.
+
+        `wrap()` reuses blocks in the tree it builds, so a cell can sit in
+        several trees at once and has to dirty all of them. The links are
+        weak references so that trees nobody uses any more can still be
+        collected; most cells have one owner, so a short list is enough.
+        """
+        return _live(self.__dict__.get("_owners", ()))
+
+    def add_owner(self, owner):
+        if not self.__dict__.get("_owners"):
+            self._owners = [weakref.ref(owner)]
+            return
+        refs = [r for r in self._owners if r() is not None]
+        if not any(r() is owner for r in refs):
+            refs.append(weakref.ref(owner))
+        self._owners = refs
+
+    def discard_owner(self, owner):
+        self._owners = [r for r in self.__dict__.get("_owners", ())
+                        if r() is not None and r() is not owner]
+
+    def mark_dirty(self):
+        """Forget cached sizes and placement here and in every ancestor"""
+        self._dirty = True
+        self._size = None
+        if not self.__dict__.get("_owners"):
+            return
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._dirty = True
+            node._size = None
+            for owner in _live(node.__dict__.get("_owners", ())):
+                # An owner that is already dirty and unsized has already
+                # passed that on to its own owners.
+                if not (owner._dirty and owner._size is None):
+                    stack.append(owner)
+
+    def mark_moved(self):
+        """Make every container holding this cell place it again"""
+        stack = _live(self.__dict__.get("_owners", ()))
+        while stack:
+            node = stack.pop()
+            if not node._dirty:
+                node._dirty = True
+                stack.extend(_live(node.__dict__.get("_owners", ())))
+
+    def __getstate__(self):
+        # Pickle a subtree on its own: owner links are restored by
+        # whichever container the cell is unpickled into.
+        state = self.__dict__.copy()
+        state.pop("_owners", None)
+        return state
+
     def render(self, screen, fill):
-        for ix in range(self.get_width()):
-            for iy in range(self.get_height()):
-                screen[self.y0 + iy][self.x0 + ix] = fill
+        for (x0, y0, x1, y1) in self.visible_rects():
+            fill_rect(screen, fill, x0, y0, x1, y1)
+
+    def visible_rects(self):
+        """Return the rectangles this cell's own fill shows in once its children are drawn"""
+        return [(self.x0, self.y0, self.x0 + self.get_width(), self.y0 + self.get_height())]
 
     def get_width(self):
         raise NotImplementedError
@@ -23,8 +91,27 @@ class Cell:
 
 class Block(Cell):
     def __init__(self, width, height):
-        self.width = width
-        self.height = height
+        # A new block has no owners to tell about its size yet.
+        self._width = width
+        self._height = height
+
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, value):
+        self._width = value
+        self.mark_dirty()
+
+    @property
+    def height(self):
+        return self._height
+
+    @height.setter
+    def height(self, value):
+        self._height = value
+        self.mark_dirty()
 
     def get_width(self):
         return self.width
@@ -33,25 +120,131 @@ class Block(Cell):
         return self.height
     
 
-class Row(Cell):
+def _live(refs):
+    return [owner for owner in map(weakref.ref.__call__, refs) if owner is not None]
+
+
+class Children(list):
+    """A list of child cells that tells its owner whenever it changes"""
+    def __init__(self, owner, children, before=()):
+        super().__init__(children)
+        self.owner = owner
+        self._adopt(self, before)
+
+    def _adopt(self, added=(), removed=()):
+        # Only the children that came or went change owners; a child
+        # that was dropped stops dirtying this owner unless it is still
+        # in the list another time.
+        for child in removed:
+            if child not in self:
+                child.discard_owner(self.owner)
+        for child in added:
+            child.add_owner(self.owner)
+        self.owner.mark_dirty()
+
+    def __reduce__(self):
+        # Pickle as a plain list; the owner wraps it again on unpickling.
+        return (list, (list(self),))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            removed = self[index]
+            value = list(value)
+        else:
+            removed = [self[index]]
+        super().__setitem__(index, value)
+        self._adopt(value if isinstance(index, slice) else [value], removed)
+
+    def __delitem__(self, index):
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._adopt(removed=removed)
+
+    def __iadd__(self, children):
+        children = list(children)
+        super().__iadd__(children)
+        self._adopt(children)
+        return self
+
+    def append(self, child):
+        super().append(child)
+        self._adopt([child])
+
+    def extend(self, children):
+        children = list(children)
+        super().extend(children)
+        self._adopt(children)
+
+    def insert(self, index, child):
+        super().insert(index, child)
+        self._adopt([child])
+
+    def pop(self, index=-1):
+        child = super().pop(index)
+        self._adopt(removed=[child])
+        return child
+
+    def remove(self, child):
+        super().remove(child)
+        self._adopt(removed=[child])
+
+    def clear(self):
+        removed = list(self)
+        super().clear()
+        self._adopt(removed=removed)
+
+    def sort(self, *, key=None, reverse=False):
+        super().sort(key=key, reverse=reverse)
+        self._adopt()
+
+    def reverse(self):
+        super().reverse()
+        self._adopt()
+
+
+class Container(Cell):
+    """A cell whose size comes from its children and is cached until they change"""
     def __init__(self, *children):
-        self.children = list(children)
+        self.children = children
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = Children(self, children, self.__dict__.get("_children", ()))
+
+    def __setstate__(self, state):
+        children = state.pop("_children")
+        self.__dict__.update(state)
+        self.children = children
 
     def get_width(self):
+        return self._get_size()[0]
+
+    def get_height(self):
+        return self._get_size()[1]
+
+    def _get_size(self):
+        if self._size is None:
+            self._size = (self.compute_width(), self.compute_height())
+        return self._size
+
+
+class Row(Container):
+    def compute_width(self):
         return sum([c.get_width() for c in self.children])
     
-    def get_height(self):
+    def compute_height(self):
         return max([c.get_height() for c in self.children], default=0)
     
 
-class Col(Cell):
-    def __init__(self, *children):
-        self.children = list(children)
-    
-    def get_width(self):
+class Col(Container):
+    def compute_width(self):
         return max([c.get_width() for c in self.children], default=0)
     
-    def get_height(self):
+    def compute_height(self):
         return sum([c.get_height() for c in self.children])
 
 
@@ -59,6 +252,13 @@ class Placing:
     def initialize_pos(self, x0=None, y0=None):
         self.x0 = x0
         self.y0 = y0
+
+    def move_to(self, x0, y0):
+        # A cell shared with another tree (wrap() reuses blocks) must be
+        # placed again there once this tree has moved it.
+        if (self.x0, self.y0) != (x0, y0):
+            self.mark_moved()
+        self.initialize_pos(x0=x0, y0=y0)
     
 
 class PlacedBlock(Block, Placing):
@@ -67,7 +267,8 @@ class PlacedBlock(Block, Placing):
         self.initialize_pos()
     
     def place(self, x0, y0):
-        self.initialize_pos(x0=x0, y0=y0)
+        self.move_to(x0, y0)
+        self._dirty = False
     
     def report(self):
         return[
@@ -84,11 +285,29 @@ class PlacedCol(Col,Placing):
         self.initialize_pos()
 
     def place(self, x0, y0):
-        self.initialize_pos(x0=x0, y0=y0)
+        # A clean subtree that is not moving is already in place.
+        if not self._dirty and (self.x0, self.y0) == (x0, y0):
+            return
+        self.move_to(x0, y0)
         y_current = self.y0
         for child in self.children:
             child.place(x0, y_current)
             y_current += child.get_height()
+        self._dirty = False
+
+    def visible_rects(self):
+        # Children paint their own areas afterwards, so only fill what
+        # they leave uncovered: to the right of each narrower child and
+        # anything below the last one.
+        x1 = self.x0 + self.get_width()
+        y_current = self.y0
+        rects = []
+        for child in self.children:
+            rects.append((child.x0 + child.get_width(), child.y0,
+                          x1, child.y0 + child.get_height()))
+            y_current = child.y0 + child.get_height()
+        rects.append((self.x0, y_current, x1, self.y0 + self.get_height()))
+        return rects
 
     def report(self):
         return [
@@ -105,13 +324,27 @@ class PlacedRow(Row, Placing):
         self.initialize_pos()
 
     def place(self, x0, y0):
-        self.initialize_pos(x0=x0, y0=y0)
+        if not self._dirty and (self.x0, self.y0) == (x0, y0):
+            return
+        self.move_to(x0, y0)
         y1 = self.y0 + self.get_height()
         x_current = x0
         for child in self.children:
             child_y = y1 - child.get_height()
             child.place(x_current, child_y)
             x_current += child.get_width()
+        self._dirty = False
+
+    def visible_rects(self):
+        # Only fill above each shorter child and anything right of the last one.
+        x_current = self.x0
+        rects = []
+        for child in self.children:
+            rects.append((child.x0, self.y0, child.x0 + child.get_width(), child.y0))
+            x_current = child.x0 + child.get_width()
+        rects.append((x_current, self.y0,
+                      self.x0 + self.get_width(), self.y0 + self.get_height()))
+        return rects
     
     def report(self):
         return [
@@ -132,6 +365,43 @@ def render(root):
     return "\n".join("".join(ch) for ch in screen)
 
 
+def render_lines(root):
+    """Yield the lines of `render(root)` one at a time without building the screen.
+
+    The visible rectangles of all cells do not overlap and together cover
+    the screen, so they can be painted in any order. They are sorted by
+    their top edge and swept down the screen: only the rectangles that
+    cross the current line are kept, and only one line is held at a time.
+    """
+    root.place(0,0)
+    width = root.get_width()
+    height = root.get_height()
+    pieces = []
+    fill = None
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        fill = next_fill(fill)
+        for (x0, y0, x1, y1) in node.visible_rects():
+            if x0 < x1 and y0 < y1:
+                pieces.append((y0, y1, x0, x1, fill))
+        if hasattr(node, "children"):
+            stack.extend(reversed(node.children))
+    pieces.sort(key=lambda p: p[0])
+
+    active = []
+    next_piece = 0
+    for y in range(height):
+        while next_piece < len(pieces) and pieces[next_piece][0] <= y:
+            active.append(pieces[next_piece])
+            next_piece += 1
+        active = [p for p in active if p[1] > y]
+        line = [""] * width
+        for (_, _, x0, x1, fill) in active:
+            line[x0:x1] = [fill] * (x1 - x0)
+        yield "".join(line)
+
+
 def make_screen(width, height):
     screen = []
     for i in range(height):
@@ -139,6 +409,15 @@ def make_screen(width, height):
     return screen
 
 
+def fill_rect(screen, fill, x0, y0, x1, y1):
+    """Fill [x0, x1) x [y0, y1) one row slice at a time"""
+    if x1 <= x0:
+        return
+    line = [fill] * (x1 - x0)
+    for y in range(y0, y1):
+        screen[y][x0:x1] = line
+
+
 def draw(screen, node, fill=None):
     fill = next_fill(fill)
     node.render(screen, fill)
@@ -163,10 +442,21 @@ class WrappedCol(PlacedCol):
 
 
 class WrappedRow(PlacedRow):
-    def __init__(self, width, *children):
+    def __init__(self, width, *children, strategy="greedy"):
         super().__init__(*children)
         assert width >= 0, "Need non-negative width"
+        assert strategy in WRAP_STRATEGIES, f"Unknown wrap strategy {strategy}"
         self.width = width
+        self.strategy = strategy
+
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, value):
+        self._width = value
+        self.mark_dirty()
     
     def get_width(self):
         return self.width
@@ -179,22 +469,66 @@ class WrappedRow(PlacedRow):
         return PlacedRow(new_col)
     
     def _bucket(self, children):
-        result = []
-        current_row = []
-        current_x = 0
-
-        for child in children:
-            child_width = child.get_width()
-            if (current_x + child_width) <= self.width:
-                current_row.append(child)
-                current_x += child_width
-            else:
-                result.append(current_row)
-                current_row = [child]
-                current_x = child_width
-
-        result.append(current_row)
-
-        return result
+        # Ask each child for its size once and let the strategy work on
+        # plain lists of numbers.
+        widths = [c.get_width() for c in children]
+        heights = [c.get_height() for c in children]
+        breaks = WRAP_STRATEGIES[self.strategy](widths, heights, self.width)
+        return [children[start:end] for (start, end) in breaks]
+    
+
+def greedy_breaks(widths, heights, width):
+    """Fill each row until the next child does not fit"""
+    result = []
+    start = 0
+    current_x = 0
+    for (i, child_width) in enumerate(widths):
+        if (current_x + child_width) <= width:
+            current_x += child_width
+        else:
+            result.append((start, i))
+            start = i
+            current_x = child_width
+    result.append((start, len(widths)))
+    return result
+
+
+def balanced_breaks(widths, heights, width):
+    """Choose row breaks that minimize raggedness and wasted height.
+
+    Each row costs the square of its unused width (except the last row,
+    as in Knuth-Plass) plus the area left empty above children shorter
+    than the row's tallest child. `best[j]` is the cheapest way to lay
+    out the first j children; a child wider than `width` gets a row of
+    its own.
+    """
+    n = len(widths)
+    best = [0] + [None] * n
+    start_of = [0] * (n + 1)
+    for end in range(1, n + 1):
+        used = tallest = area = 0
+        for start in range(end - 1, -1, -1):
+            used += widths[start]
+            if used > width and start < end - 1:
+                break
+            tallest = max(tallest, heights[start])
+            area += widths[start] * heights[start]
+            slack = 0 if end == n else max(width - used, 0)
+            cost = best[start] + slack * slack + (tallest * used - area)
+            if best[end] is None or cost < best[end]:
+                best[end] = cost
+                start_of[end] = start
+    result = []
+    end = n
+    while end > 0:
+        result.append((start_of[end], end))
+        end = start_of[end]
+    return result[::-1] or [(0, 0)]
+
+
+WRAP_STRATEGIES = {
+    "greedy": greedy_breaks,
+    "balanced": balanced_breaks,
+}
     
 # GVW: nice work.
@@ -1,13 +1,61 @@
+import weakref
+
 class Cell:
     """this is the base representation of the attributes of a display unit"""
+    # the screen kept up to date for this tree, set on the root only
+    screen = None
+
     def __init__(self):
         self.has_content = False
+        self.contents = []
+        # every row or column holding this cell: wrapping reuses cells in
+        # new containers, so a cell can belong to several trees at once
+        self.owners = weakref.WeakSet()
     
     def set_content(self, content, x, y):
+        """replace all of this cell's content with `content` at (x, y)"""
+        self.clear_content()
         self.content = content
         self.content_x = x
         self.content_y = y
+        self.add_content(content, x, y)
+
+    def add_content(self, content, x, y):
+        """add another piece of content; later pieces are drawn over earlier ones"""
+        self.contents.append((content, x, y))
         self.has_content = True
+        self.damage_content()
+
+    def clear_content(self):
+        self.damage_content()
+        self.contents = []
+        self.has_content = False
+
+    def content_lines(self):
+        """yield (x, y, line) for every line of every piece of content"""
+        for (content, x, y) in self.contents:
+            for (i, line) in enumerate(content.split("\n")):
+                yield (x, y + i, line)
+
+    def get_screens(self):
+        """return the screens of every tree this cell belongs to"""
+        screens = []
+        seen = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if node.screen is not None:
+                screens.append(node.screen)
+            stack.extend(node.owners)
+        return screens
+
+    def damage_content(self):
+        for screen in self.get_screens():
+            for (x, y, line) in self.content_lines():
+                screen.damage(x, y, x + len(line), y + 1)
     
     def get_content_pos(self):
         return (self.content_x, self.content_y)
@@ -28,6 +76,28 @@ class Block(Cell):
         self.width = width
         self.height = height
 
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, value):
+        self._width = value
+        self.damage_layout()
+
+    @property
+    def height(self):
+        return self._height
+
+    @height.setter
+    def height(self, value):
+        self._height = value
+        self.damage_layout()
+
+    def damage_layout(self):
+        for screen in self.get_screens():
+            screen.resized = True
+
     def get_width(self):
         return self.width
     
@@ -39,6 +109,8 @@ class Row(Cell):
     def __init__(self, children):
         super().__init__()
         self.children = list(children)
+        for child in self.children:
+            child.owners.add(self)
 
     def get_width(self):
         return sum([c.get_width() for c in self.children])
@@ -51,6 +123,8 @@ class Col(Cell):
     def __init__(self, children):
         super().__init__()
         self.children = list(children)
+        for child in self.children:
+            child.owners.add(self)
     
     def get_width(self):
         return max([c.get_width() for c in self.children], default=0)
@@ -146,17 +220,24 @@ def next_fill(fill):
     return 'a' if fill is None else chr(ord(fill) + 1)
 
 def render_obj(screen, fill, obj):
-    for iy in range(obj.get_height()):
-        for ix in range(obj.get_width()):
-            current_x = obj.x0 + ix
-            current_y = obj.y0 + iy
-            # GVW: can the `obj.has_content` test be moved up to the top
-            # of the method so it's not repeated inside the loop? I.e.,
-            # can the method start with `if not obj.has_content: return`
-            # or something like that? Why or why not?
-            if obj.has_content and obj.intersect_content(current_x, current_y):
-                content_index = current_x - obj.content_x
-                screen[current_y][current_x] = obj.get_content()[content_index]
+    for (y, start, text) in clipped_content(obj, obj.x0, obj.y0,
+                                            obj.x0 + obj.get_width(), obj.y0 + obj.get_height()):
+        screen[y][start:start + len(text)] = text
+
+def clipped_content(obj, x0, y0, x1, y1):
+    """yield (y, x, text) for the content of `obj` inside both the object and [x0, x1) x [y0, y1)
+
+    Each line is cut to fit once, so it can be written with one slice
+    assignment instead of checking every pixel of the object.
+    """
+    left, right = max(x0, obj.x0), min(x1, obj.x0 + obj.get_width())
+    top, bottom = max(y0, obj.y0), min(y1, obj.y0 + obj.get_height())
+    if left >= right or top >= bottom:
+        return
+    for (x, y, line) in obj.content_lines():
+        start, end = max(left, x), min(right, x + len(line))
+        if top <= y < bottom and start < end:
+            yield (y, start, line[start - x:end - x])
 
 class Renderable:
     def render(self, screen, fill):
@@ -166,11 +247,11 @@ class Renderable:
                 render_obj(screen, fill, child)
         
     def intersect_content(self, current_x, current_y):
-        content_x, content_y = self.get_content_pos()
-        return (
-            current_x >= content_x and 
-            current_x < content_x + len(self.get_content()) and 
-            current_y == content_y
+        return any(
+            current_x >= x and 
+            current_x < x + len(line) and 
+            current_y == y
+            for (x, y, line) in self.content_lines()
         )
 
 class RenderedBlock(PlacedBlock, Renderable):
@@ -229,6 +310,167 @@ class WrappedRow(PlacedRow):
 
         return result
     
+class Screen:
+    """this is a screen kept between frames that only redraws what changed
+
+    New content damages the old and new content spans. A resized block
+    lays the tree out again and damages every cell whose rectangle moved.
+    `update` redraws the damaged rows and returns the spans that changed.
+    """
+    def __init__(self, root):
+        self.root = root
+        root.screen = self
+        self.rows = None
+        self.width = self.height = 0
+        self.rects = {}
+        self.damaged = []
+        self.resized = True
+
+    def damage(self, x0, y0, x1, y1):
+        self.damaged.append((x0, y0, x1, y1))
+
+    def update(self):
+        """Redraw the damaged parts of the screen and return the changed (y, x0, x1) spans"""
+        if self.resized:
+            self.layout()
+        lines = {}
+        for (x0, y0, x1, y1) in self.damaged:
+            x0, x1 = max(x0, 0), min(x1, self.width)
+            if x0 < x1:
+                for y in range(max(y0, 0), min(y1, self.height)):
+                    lines.setdefault(y, []).append((x0, x1))
+        self.damaged = []
+
+        changed = []
+        for y in sorted(lines):
+            row = self.rows[y]
+            for (x0, x1) in merge_spans(lines[y]):
+                before = row[x0:x1]
+                row[x0:x1] = [''] * (x1 - x0)
+                redraw(row, self.root, x0, y, x1)
+                changed.extend(changed_spans(before, row[x0:x1], x0, y))
+        return changed
+
+    def layout(self):
+        self.resized = False
+        self.root.place(0, 0)
+        rects = {id(node): (node.x0, node.y0, node.x0 + node.get_width(), node.y0 + node.get_height())
+                 for node in walk(self.root)}
+        width, height = self.root.get_width(), self.root.get_height()
+        if self.rows is None or (width, height) != (self.width, self.height):
+            # None differs from everything drawn, so every cell of a new
+            # screen is reported as changed.
+            self.rows = [[None] * width for _ in range(height)]
+            self.width, self.height = width, height
+            self.damage(0, 0, width, height)
+        else:
+            for key in self.rects.keys() | rects.keys():
+                old, new = self.rects.get(key), rects.get(key)
+                if old != new:
+                    for rect in (old, new):
+                        if rect is not None:
+                            self.damage(*rect)
+        self.rects = rects
+
+    def text(self):
+        return "\n".join("".join(ch if ch is not None else ' ' for ch in row) for row in self.rows)
+
+class SpatialIndex:
+    """this is a uniform grid over the placed cells for point and rectangle queries
+
+    Build it after `place()`. Every cell is listed in each grid square it
+    touches, in drawing order, so queries only look at the few cells in
+    the squares they cover and return them in the order they are drawn.
+    """
+    def __init__(self, root, cell_size=None):
+        self.nodes = []
+        self.rects = []
+        for node in walk(root):
+            x0, y0 = node.x0, node.y0
+            x1, y1 = x0 + node.get_width(), y0 + node.get_height()
+            if x0 < x1 and y0 < y1:
+                self.nodes.append(node)
+                self.rects.append((x0, y0, x1, y1))
+        self.width, self.height = root.get_width(), root.get_height()
+        if cell_size is None:
+            # About one grid square per cell.
+            cell_size = int((self.width * self.height / max(len(self.nodes), 1)) ** 0.5)
+        self.cell_size = max(cell_size, 1)
+        self.cols = -(-self.width // self.cell_size)
+        self.grid = [[] for _ in range(self.cols * -(-self.height // self.cell_size))]
+        for (i, rect) in enumerate(self.rects):
+            for square in self._squares(*rect):
+                square.append(i)
+
+    def _squares(self, x0, y0, x1, y1):
+        size = self.cell_size
+        x0, y0 = max(x0, 0) // size, max(y0, 0) // size
+        x1, y1 = -(-min(x1, self.width) // size), -(-min(y1, self.height) // size)
+        for gy in range(y0, y1):
+            yield from self.grid[gy * self.cols + x0:gy * self.cols + x1]
+
+    def at(self, x, y):
+        """Return the cells containing (x, y), outermost first"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return []
+        square = self.grid[(y // self.cell_size) * self.cols + x // self.cell_size]
+        rects = self.rects
+        return [self.nodes[i] for i in square
+                if rects[i][0] <= x < rects[i][2] and rects[i][1] <= y < rects[i][3]]
+
+    def hit(self, x, y):
+        """Return the innermost cell at (x, y), i.e., the one drawn last, or None"""
+        found = self.at(x, y)
+        return found[-1] if found else None
+
+    def overlapping(self, x0, y0, x1, y1):
+        """Return the cells that overlap [x0, x1) x [y0, y1) in drawing order"""
+        rects = self.rects
+        found = set()
+        for square in self._squares(x0, y0, x1, y1):
+            found.update(i for i in square
+                         if rects[i][0] < x1 and x0 < rects[i][2] and
+                         rects[i][1] < y1 and y0 < rects[i][3])
+        return [self.nodes[i] for i in sorted(found)]
+
+def walk(node):
+    yield node
+    for child in getattr(node, "children", []):
+        yield from walk(child)
+
+def redraw(row, node, x0, y, x1):
+    """Rewrite the content of `node` and its descendants that falls on row y, x0 <= x < x1"""
+    if not (max(x0, node.x0) < min(x1, node.x0 + node.get_width()) and
+            node.y0 <= y < node.y0 + node.get_height()):
+        return
+    for (_, start, text) in clipped_content(node, x0, y, x1, y + 1):
+        row[start:start + len(text)] = text
+    for child in getattr(node, "children", []):
+        redraw(row, child, x0, y, x1)
+
+def merge_spans(spans):
+    merged = []
+    for (x0, x1) in sorted(spans):
+        if merged and x0 <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], x1)
+        else:
+            merged.append([x0, x1])
+    return merged
+
+def changed_spans(before, after, x0, y):
+    """Return (y, x0, x1) for each run of cells that differ between before and after"""
+    spans = []
+    start = None
+    for i, (old, new) in enumerate(zip(before, after)):
+        if old != new and start is None:
+            start = i
+        elif old == new and start is not None:
+            spans.append((y, x0 + start, x0 + i))
+            start = None
+    if start is not None:
+        spans.append((y, x0 + start, x0 + len(after)))
+    return spans
+
 
 if __name__ == '__main__':
     rb = RenderedBlock(6, 6)
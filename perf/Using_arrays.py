@@ -1,77 +1,633 @@
 import array
+import heapq
+import itertools
+import operator
 
-array.array
-
-class DataFrame:
-    def ncol(self):
-        """Report the number of columns"""
-    
-    def nrow(self):
-        """Report the number of rows"""
-    
-    def cols(self):
-        """Return the set of columns name"""
-    
-    def eq(self, other):
-        """Check equality with another dataframe"""
-    
-    def get(self, col, row):
-        """Get a scalr value"""
-    
-    def select(self, *others):
-        """Select a named subset of columns"""
-    
-    def filter(self, func):
-        """Selecte a subset of rows be testing values"""
+from empty_dataframes import DataFrame, DfRow, share_strings
+from expressions import Expr
+from indexes import HashIndex, build_index, index_lookup
+from joins import hash_join
 
 def all_eg(*values):
     return (not values) or all(v==values[0] for v in values)
 
+# Typecodes for the column types that fit in an `array.array`. Booleans
+# get their own column class so that reading them gives back `bool`.
+TYPECODES = {int: "q", float: "d"}
+
+class BoolColumn(array.array):
+    """Booleans stored one byte each"""
+    def __new__(cls, values=()):
+        return super().__new__(cls, "b", values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return BoolColumn(array.array.__iter__(super().__getitem__(i)))
+        return bool(super().__getitem__(i))
+
+    def __iter__(self):
+        return map(bool, super().__iter__())
+
+class StrColumn:
+    """Strings packed end to end in one UTF-8 buffer, found by offsets"""
+    def __init__(self, values=()):
+        self._pack([v.encode() for v in values])
+
+    def _pack(self, encoded):
+        self.offsets = array.array("q", [0])
+        self.offsets.extend(itertools.accumulate(map(len, encoded)))
+        self.buffer = b"".join(encoded)
+
+    def extend(self, values):
+        """Append strings in place"""
+        encoded = [v.encode() for v in values]
+        lengths = itertools.accumulate(map(len, encoded), initial=self.offsets[-1])
+        self.offsets.extend(itertools.islice(lengths, 1, None))
+        if not isinstance(self.buffer, bytearray):
+            self.buffer = bytearray(self.buffer)
+        self.buffer += b"".join(encoded)
+
+    def take(self, rows):
+        """Gather the strings at the given row numbers, without decoding them"""
+        # Read `rows` once, and index `offsets` at i + 1 rather than copying
+        # it, so gathering a few rows stays cheap on a long column.
+        rows = list(rows)
+        starts = map(self.offsets.__getitem__, rows)
+        ends = map(self.offsets.__getitem__, map(operator.add, rows, itertools.repeat(1)))
+        return self._slices(starts, ends)
+
+    def _range(self, start, end):
+        result = StrColumn()
+        base = self.offsets[start]
+        result.offsets = self.offsets[start:end + 1]
+        if base:
+            result.offsets = array.array(
+                "q", map(operator.sub, result.offsets, itertools.repeat(base)))
+        result.buffer = bytes(self.buffer[base:self.offsets[end]])
+        return result
+
+    def _slices(self, starts, ends):
+        result = StrColumn()
+        result._pack(list(map(self.buffer.__getitem__, map(slice, starts, ends))))
+        return result
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            (start, end, step) = i.indices(len(self))
+            assert step == 1, "StrColumn slices must be contiguous"
+            return self._range(start, max(start, end))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StrColumn index out of range")
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def __iter__(self):
+        buffer, offsets = self.buffer, self.offsets
+        for i in range(len(self)):
+            yield buffer[offsets[i]:offsets[i + 1]].decode()
+
+def code_typecode(size):
+    """Return the smallest array typecode that can hold codes below `size`"""
+    if size <= 1 << 8:
+        return "B"
+    if size <= 1 << 16:
+        return "H"
+    return "q"
+
+class DictColumn:
+    """Strings stored as small integer codes into a tuple of distinct values.
+
+    Gathering, slicing and selecting share the dictionary tuple rather
+    than copying it, so columns derived from each other can be compared
+    code by code.
+    """
+    def __init__(self, codes, dictionary):
+        self.codes = codes
+        self.dictionary = dictionary
+        # The code of each dictionary value, built by the first extend
+        # and kept up to date by later ones.
+        self._positions = None
+
+    @classmethod
+    def encode(cls, values, dictionary=()):
+        column = cls(array.array(code_typecode(len(dictionary))), dictionary)
+        column.extend(values)
+        return column
+
+    def extend(self, values):
+        """Append strings in place, growing the dictionary if needed"""
+        if self._positions is None:
+            self._positions = {v: i for (i, v) in enumerate(self.dictionary)}
+        positions = self._positions
+        codes = [positions.setdefault(v, len(positions)) for v in values]
+        if len(positions) > len(self.dictionary):
+            self.dictionary = tuple(positions)
+            typecode = code_typecode(len(self.dictionary))
+            if typecode != self.codes.typecode:
+                self.codes = array.array(typecode, self.codes)
+        self.codes.extend(codes)
+
+    def take(self, rows):
+        return DictColumn(array.array(self.codes.typecode, map(self.codes.__getitem__, rows)),
+                          self.dictionary)
+
+    def compare_constant(self, op, value):
+        """Compare every value with a constant by code, or return None if unsupported"""
+        if op not in (operator.eq, operator.ne):
+            return None
+        if value not in self.dictionary:
+            return itertools.repeat(op is operator.ne, len(self))
+        code = self.dictionary.index(value)
+        if self.codes.typecode == "B":
+            # One C-level pass: map every byte-sized code straight to 0 or 1.
+            table = bytearray([op is operator.ne]) * 256
+            table[code] = op is operator.eq
+            return self.codes.tobytes().translate(table)
+        return map(op, self.codes, itertools.repeat(code))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return DictColumn(self.codes[i], self.dictionary)
+        return self.dictionary[self.codes[i]]
+
+    def __iter__(self):
+        return map(self.dictionary.__getitem__, self.codes)
+
+def worth_encoding(distinct, rows):
+    """Whether `rows` strings with `distinct` values repeat enough to dictionary-encode"""
+    return distinct <= rows // 2
+
+def make_column(kind, values):
+    """Pick the most compact storage for values that all have type `kind`
+
+    Values that do not all fit it (the None a left join fills in, say)
+    are kept in a plain list.
+    """
+    if kind is str:
+        distinct = set(values)
+        if not all(type(v) is str for v in distinct):
+            return list(values)
+        # Dictionary-encode columns that repeat their values a lot.
+        if worth_encoding(len(distinct), len(values)):
+            return DictColumn.encode(values)
+        return StrColumn(values)
+    try:
+        if kind is bool:
+            return BoolColumn(values)
+        if kind in TYPECODES:
+            return array.array(TYPECODES[kind], values)
+    except (TypeError, OverflowError):
+        pass
+    return list(values)
+
+# Rows per chunk once a column has been appended to.
+CHUNK_ROWS = 65536
+
+class ChunkedColumn:
+    """A column kept as a list of typed chunks of CHUNK_ROWS values each.
+
+    Only the last chunk may be shorter. Appending builds a new
+    ChunkedColumn that shares every full chunk with the old one, so
+    frames and views holding the old column never see it change.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    @classmethod
+    def split(cls, column):
+        if isinstance(column, ChunkedColumn):
+            return column
+        return cls(list(split_column(column)))
+
+    def appended(self, column):
+        """Return a new ChunkedColumn with the values of `column` at the end"""
+        if isinstance(column, ChunkedColumn):
+            column = column.flatten()
+        chunks = list(self.chunks)
+        if chunks and len(chunks[-1]) < CHUNK_ROWS:
+            column = concat_columns([chunks.pop(), column])
+        chunks.extend(split_column(column))
+        return ChunkedColumn(chunks)
+
+    def flatten(self):
+        """Return the values as one typed column"""
+        return concat_columns(self.chunks)
+
+    def take(self, rows):
+        return column_like(self.chunks[0], map(self.__getitem__, rows))
+
+    def __len__(self):
+        if not self.chunks:
+            return 0
+        return CHUNK_ROWS * (len(self.chunks) - 1) + len(self.chunks[-1])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ChunkedColumn index out of range")
+        (chunk, offset) = divmod(i, CHUNK_ROWS)
+        return self.chunks[chunk][offset]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+def column_kind(column):
+    """Return the type of the values a column holds, or None if unknown"""
+    if isinstance(column, ChunkedColumn):
+        return column_kind(column.chunks[0]) if column.chunks else None
+    if isinstance(column, BoolColumn):
+        return bool
+    if isinstance(column, (StrColumn, DictColumn)):
+        return str
+    if isinstance(column, array.array):
+        return int if column.typecode == TYPECODES[int] else float
+    return type(column[0]) if len(column) else None
+
+def column_like(column, values):
+    """Store values the same way as `column`"""
+    if isinstance(column, (BoolColumn, StrColumn)):
+        return type(column)(values)
+    if isinstance(column, DictColumn):
+        return DictColumn.encode(values, column.dictionary)
+    if isinstance(column, array.array):
+        return array.array(column.typecode, values)
+    return list(values)
+
+def concat_columns(columns):
+    """Return a new column holding the values of each column in turn"""
+    columns = [c for c in columns if len(c)]
+    if not columns:
+        return []
+    first = columns[0]
+    if all(isinstance(c, DictColumn) for c in columns):
+        result = DictColumn(array.array(first.codes.typecode), first.dictionary)
+        for c in columns:
+            if c.dictionary is result.dictionary:
+                result.codes.extend(c.codes)
+            else:
+                result.extend(c)
+        return result
+    if all(isinstance(c, (StrColumn, DictColumn)) for c in columns):
+        columns = [c if isinstance(c, StrColumn) else StrColumn(c) for c in columns]
+    if all(isinstance(c, StrColumn) for c in columns):
+        result = StrColumn()
+        offsets = array.array("q", [0])
+        for c in columns:
+            if offsets[-1]:
+                offsets.extend(map(operator.add, c.offsets[1:], itertools.repeat(offsets[-1])))
+            else:
+                offsets.extend(c.offsets[1:])
+        result.offsets = offsets
+        result.buffer = b"".join(c.buffer for c in columns)
+        return result
+    if isinstance(first, array.array) and all(
+            type(c) is type(first) and c.typecode == first.typecode for c in columns):
+        result = column_like(first, ())
+        for c in columns:
+            result.extend(c)
+        return result
+    return list(itertools.chain.from_iterable(columns))
+
+def split_column(column):
+    """Cut a column into chunks of CHUNK_ROWS values"""
+    for start in range(0, len(column), CHUNK_ROWS):
+        yield column[start:start + CHUNK_ROWS]
+
+def take_column(column, rows):
+    """Gather the values of a column at the given row numbers"""
+    if isinstance(column, (StrColumn, DictColumn, ChunkedColumn)):
+        return column.take(rows)
+    if isinstance(column, array.array):
+        # Go through the base class so BoolColumn does not box every value.
+        values = map(array.array.__getitem__.__get__(column), rows)
+        if isinstance(column, BoolColumn):
+            return BoolColumn(values)
+        return array.array(column.typecode, values)
+    return list(map(column.__getitem__, rows))
+
+def columns_equal(left, right):
+    """Compare two columns as whole buffers where their storage allows"""
+    if len(left) != len(right):
+        return False
+    if isinstance(left, StrColumn) and isinstance(right, StrColumn):
+        return left.offsets == right.offsets and left.buffer == right.buffer
+    if isinstance(left, DictColumn) and isinstance(right, DictColumn) \
+            and left.dictionary == right.dictionary:
+        return left.codes == right.codes
+    if isinstance(left, array.array) and isinstance(right, array.array):
+        return left == right
+    return all(map(operator.eq, left, right))
+
+# Reductions available to GroupBy.agg. Each takes the values of one group.
+AGGREGATES = {
+    "count": len,
+    "sum": sum,
+    "mean": lambda values: sum(values) / len(values),
+    "min": min,
+    "max": max,
+}
+
 class DfCol(DataFrame):
     def __init__(self, **kwargs):
         assert len(kwargs) > 0 
-        assert all_eg(len(kwargs[k]) for k in kwargs)
+        assert all_eg(*[len(kwargs[k]) for k in kwargs])
+        self._data = {}
         for k in kwargs:
-            assert all_eg(type(v) for v in kwargs[k])
-        self._data = kwargs
+            assert all_eg(*[type(v) for v in kwargs[k]])
+            kind = type(kwargs[k][0]) if len(kwargs[k]) else None
+            self._data[k] = make_column(kind, kwargs[k])
+        self._rows = None
+        self._indexes = {}
+
+    @classmethod
+    def _from_columns(cls, data, rows=None, indexes=None):
+        """Wrap columns that are already typed and checked.
+
+        If `rows` is given the frame is a view: it shares the columns in
+        `data` and only sees the listed row numbers of them.
+        """
+        df = cls.__new__(cls)
+        df._data = data
+        df._rows = rows
+        df._indexes = {} if indexes is None else indexes
+        return df
+
+    def _column(self, name):
+        """Return the values of one column as this frame sees them"""
+        if self._rows is None:
+            return self._data[name]
+        return take_column(self._data[name], self._rows)
+
+    def _keys(self, names):
+        """Return the values of one column, or tuples of several, per row"""
+        if len(names) == 1:
+            return self._column(names[0])
+        return zip(*[self._column(n) for n in names])
+
+    def _take(self, name, rows):
+        """Gather one column at row numbers of this frame"""
+        if self._rows is not None:
+            rows = array.array("q", map(self._rows.__getitem__, rows))
+        return take_column(self._data[name], rows)
+
+    def _row_ids(self):
+        """Return the row numbers of the underlying columns in view order"""
+        if self._rows is None:
+            return range(len(self._data[next(iter(self._data))]))
+        return self._rows
+
+    def copy(self):
+        """Return a frame that owns its columns instead of sharing them"""
+        return DfCol._from_columns({n: self._column(n) for n in self._data},
+                                   indexes=dict(self._indexes))
+
+    def create_index(self, col, kind="hash"):
+        """Index a column so filters comparing it to constants skip the scan"""
+        assert col in self._data
+        self._indexes[col] = build_index(kind, self._column(col))
     
     def ncol(self):
         return len(self._data)
     
     def nrow(self):
-        n = list(self._data.keys())[0]
-        return len(self._data[n])
+        return len(self._row_ids())
     
     def cols(self):
         return set(self._data.keys())
     
     def get(self, col, row):
         assert col in self._data 
-        assert 0 <= row < len(self._data[col])
+        assert 0 <= row < self.nrow()
+        if self._rows is not None:
+            row = self._rows[row]
         return self._data[col][row]
     
     def eq(self, other):
         assert isinstance(other, DataFrame)
+        if isinstance(other, DfCol) and self.cols() == other.cols():
+            return all(columns_equal(self._column(n), other._column(n))
+                       for n in self._data)
         for n in self._data:
             if n not in other.cols():
                 return False
-            for i in range(len(self._data[n])):
+            for i in range(self.nrow()):
                 if self.get(n,i) != other.get(n,i):
                     return False
         return True
 
     def select(self, *names):
+        assert names
         assert all(n in self._data for n in names)
-        return DfCol(**{n: self._data[n] for n in names})
+        # Row numbers are unchanged, so indexes on kept columns still hold.
+        indexes = {n: ix for (n, ix) in self._indexes.items() if n in names}
+        return DfCol._from_columns({n: self._data[n] for n in names}, self._rows,
+                                   indexes)
     
     def filter(self, func):
-        result = {n: [] for n in self._data}
-        for i in range(self.nrow()):
-            args = {n: self._data[n][i] for n in self._data}
-            if func(**args):
-                for n in self._data:
-                    result[n].append(self._data[n][i])
-        return DfCol(**result)
+        if isinstance(func, Expr):
+            assert func.columns() <= self.cols()
+            found = index_lookup(func, self._indexes)
+            if found is not None:
+                (positions, rest) = found
+                ids = self._row_ids()
+                rows = array.array("q", map(ids.__getitem__, positions))
+                narrowed = DfCol._from_columns(self._data, rows)
+                return narrowed if rest is None else narrowed.filter(rest)
+            mask = func.mask(self._column, self.nrow())
+        else:
+            mask = bytes(
+                bool(func(**{n: self._data[n][i] for n in self._data}))
+                for i in self._row_ids()
+            )
+        rows = array.array("q", itertools.compress(self._row_ids(), mask))
+        return DfCol._from_columns(self._data, rows)
     
+    def _sort_keys(self, name):
+        """Return a column's values in something with a C-level __getitem__"""
+        column = self._column(name)
+        return column if type(column) is array.array else list(column)
+
+    def _reorder(self, positions):
+        """Return a view showing this frame's rows in the given order"""
+        ids = self._row_ids()
+        return DfCol._from_columns(self._data, array.array("q", map(ids.__getitem__, positions)))
+
+    def sort_by(self, *names, descending=False):
+        """Sort rows by one or more columns, the first name being the most significant.
+
+        `descending` is one flag for every column or a sequence of flags,
+        one per column. The sort computes one row permutation and returns
+        a view through it, so columns are only gathered when read.
+        """
+        assert names
+        assert all(n in self._data for n in names)
+        if isinstance(descending, bool):
+            descending = [descending] * len(names)
+        assert len(descending) == len(names)
+        order = list(range(self.nrow()))
+        # Python's sort is stable, so sorting by the least significant
+        # column first leaves ties ordered by the later passes.
+        for (name, reverse) in reversed(list(zip(names, descending))):
+            order.sort(key=self._sort_keys(name).__getitem__, reverse=reverse)
+        return self._reorder(order)
+
+    def nlargest(self, k, name):
+        """Return the k rows with the largest values of a column, largest first"""
+        assert name in self._data
+        keys = self._sort_keys(name)
+        return self._reorder(heapq.nlargest(k, range(len(keys)), key=keys.__getitem__))
+
+    def nsmallest(self, k, name):
+        """Return the k rows with the smallest values of a column, smallest first"""
+        assert name in self._data
+        keys = self._sort_keys(name)
+        return self._reorder(heapq.nsmallest(k, range(len(keys)), key=keys.__getitem__))
+
+    def group_by(self, *names):
+        assert names
+        assert all(n in self._data for n in names)
+        return GroupBy(self, names)
+
+    def join(self, other, on, how="inner"):
+        """Join with another frame on equal values of the `on` column(s).
+
+        The result has this frame's columns followed by the other frame's
+        non-key columns. A left join fills unmatched rows with None.
+        """
+        other = other.to_columns()
+        on = (on,) if isinstance(on, str) else tuple(on)
+        assert on
+        assert all(n in self._data and n in other._data for n in on)
+        extra = [n for n in other._data if n not in on]
+        assert not (set(extra) & self.cols()), "Join would duplicate column names"
+
+        (left_rows, right_rows) = hash_join(self._keys(on), other._keys(on), how)
+        data = {n: self._take(n, left_rows) for n in self._data}
+        missing = how == "left" and -1 in right_rows
+        for n in extra:
+            if missing:
+                column = other._column(n)
+                data[n] = [column[j] if j >= 0 else None for j in right_rows]
+            else:
+                data[n] = other._take(n, right_rows)
+        return DfCol._from_columns(data)
+
+    @classmethod
+    def from_csv(cls, path, chunk_rows=65536):
+        """Load a CSV file with a header row, `chunk_rows` rows at a time"""
+        # Imported here because column_io builds on this module.
+        from column_io import read_csv
+        return cls._from_columns(read_csv(path, chunk_rows))
+
+    @classmethod
+    def from_binary(cls, path):
+        """Load a file written by `to_binary`"""
+        from column_io import read_binary
+        return cls._from_columns(read_binary(path))
+
+    def to_binary(self, path):
+        """Save the typed column buffers with a header describing them"""
+        from column_io import write_binary
+        write_binary({n: self._column(n) for n in self._data}, self.nrow(), path)
+
+    def append_rows(self, **kwargs):
+        """Add rows at the end, given column by column as in the constructor.
+
+        Only the new values are checked. The columns become ChunkedColumns,
+        so existing chunks are shared rather than copied.
+        """
+        assert set(kwargs) == self.cols()
+        assert all_eg(*[len(kwargs[k]) for k in kwargs])
+        columns = {}
+        for k in kwargs:
+            assert all_eg(*[type(v) for v in kwargs[k]])
+            kind = type(kwargs[k][0]) if len(kwargs[k]) else None
+            columns[k] = make_column(kind, kwargs[k])
+        self._append_columns(columns)
+
+    def extend(self, other):
+        """Add the rows of another frame with the same columns at the end"""
+        other = other.to_columns()
+        assert other.cols() == self.cols()
+        self._append_columns({n: other._column(n) for n in self._data})
+
+    def _append_columns(self, columns):
+        assert self._rows is None, "Cannot append to a view; copy() it first"
+        for n in columns:
+            (old, new) = (column_kind(self._data[n]), column_kind(columns[n]))
+            assert old is None or new is None or old is new, \
+                f"Column {n} holds {old.__name__}, not {new.__name__}"
+        # Build a new dict so views that share the old one are unaffected.
+        self._data = {n: ChunkedColumn.split(self._data[n]).appended(columns[n])
+                      for n in self._data}
+        self._indexes = {}
+
+    def to_rows(self):
+        names = list(self._data)
+        columns = [self._column(n) for n in names]
+        rows = list(map(dict, map(zip, itertools.repeat(names), zip(*columns))))
+        # These rows are new, so their strings can be shared in place.
+        share_strings(rows)
+        return DfRow._from_rows(rows)
+
+    def to_columns(self):
+        return self
+
     def __str__(self):
-        return str(self._data)
+        return str({n: list(self._column(n)) for n in self._data})
+
+class GroupBy:
+    """The rows of a DfCol grouped by the values of some of its columns"""
+    def __init__(self, frame, names):
+        self._frame = frame
+        self._names = names
+        index = frame._indexes.get(names[0]) if len(names) == 1 else None
+        if not isinstance(index, HashIndex):
+            index = HashIndex(frame._keys(names))
+        self._groups = index.groups()
+
+    def agg(self, **specs):
+        """Reduce columns per group, e.g. agg(sum="price", max=("price", "qty"))
+
+        The result has one row per group: the grouping columns, then one
+        column named `<column>_<reduction>` per requested reduction.
+        """
+        assert specs
+        assert all(func in AGGREGATES for func in specs)
+        keys = list(self._groups)
+        positions = list(self._groups.values())
+
+        result = {}
+        if len(self._names) == 1:
+            result[self._names[0]] = keys
+        else:
+            for (j, n) in enumerate(self._names):
+                result[n] = [k[j] for k in keys]
+
+        # Gather each column into per-group buffers once, however many
+        # reductions read it.
+        gathered = {}
+        for (func, names) in specs.items():
+            reduce = AGGREGATES[func]
+            for n in ((names,) if isinstance(names, str) else names):
+                assert n in self._frame.cols()
+                if func == "count":
+                    result[f"{n}_{func}"] = [len(p) for p in positions]
+                    continue
+                if n not in gathered:
+                    column = self._frame._column(n)
+                    gathered[n] = [take_column(column, p) for p in positions]
+                result[f"{n}_{func}"] = list(map(reduce, gathered[n]))
+
+        return DfCol._from_columns({
+            n: make_column(type(values[0]) if values else None, values)
+            for (n, values) in result.items()
+        })
@@ -0,0 +1,189 @@
+'''Time the DataFrame layouts on synthetic frames and record the results.
+
+    python benchmark.py --rows 100000 --cols 6 --types int,float,str,bool \
+        --output results.json --compare baseline.json
+
+Every operation is timed `--repeat` times (the best run is kept) and then
+run once more under tracemalloc to record its peak memory. With
+`--compare`, any operation that got slower or bigger than the baseline by
+more than `--threshold` is reported as a regression.
+'''
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from empty_dataframes import DfRow
+from expressions import col, lit
+from Using_arrays import DfCol
+
+GENERATORS = {
+    "int": lambda rng: rng.randint(0, 1000),
+    "float": lambda rng: rng.random(),
+    "str": lambda rng: rng.choice(["red", "green", "blue", "cyan", "magenta"]),
+    "bool": lambda rng: rng.random() < 0.5,
+}
+
+
+def make_columns(nrow, ncol, types, seed=0):
+    """Generate column data, cycling through `types` for successive columns"""
+    rng = random.Random(seed)
+    columns = {}
+    for i in range(ncol):
+        kind = types[i % len(types)]
+        columns[f"{kind}_{i}"] = [GENERATORS[kind](rng) for _ in range(nrow)]
+    return columns
+
+
+def to_rows(columns):
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+# Each layout is (prepare, build): `prepare` turns column data into the
+# layout's input outside the timer and `build` is timed as construction.
+LAYOUTS = {
+    "DfRow": (to_rows, DfRow),
+    "DfCol": (dict, lambda columns: DfCol(**columns)),
+    # A DfCol view over every row: the same buffers, read through a
+    # row-number array.
+    "DfCol-view": (dict, lambda columns: DfCol(**columns).filter(lit(True))),
+}
+
+
+def operations(columns):
+    """Return (name, op) pairs; each op is called with two equal frames"""
+    names = list(columns)
+    first = names[0]
+    middle = len(columns[first]) // 2
+    threshold = sorted(columns[first])[middle]
+    kept = names[:max(1, len(names) // 2)]
+    return [
+        ("get", lambda pair: [pair[0].get(n, middle) for n in names]),
+        ("select", lambda pair: pair[0].select(*kept)),
+        ("filter_expr", lambda pair: pair[0].filter(col(first) < threshold)),
+        ("filter_func", lambda pair: pair[0].filter(lambda **row: row[first] < threshold)),
+        ("eq", lambda pair: pair[0].eq(pair[1])),
+    ]
+
+
+def check_left_join():
+    """Make sure a left join's None-filled columns survive conversion both ways"""
+    left = DfCol(k=[1, 2, 3, 4], w=["x", "y", "x", "y"])
+    right = DfCol(k=[1, 3], v=[10, 30], tag=["a", "b"], ok=[True, False])
+    for frame in (left, left.to_rows()):
+        joined = frame.join(right, "k", how="left")
+        assert [joined.get("v", i) for i in range(4)] == [10, None, 30, None]
+        assert joined.to_columns().to_rows().eq(joined)
+        assert joined.to_rows().to_columns().eq(joined)
+        groups = joined.to_columns().group_by("tag").agg(count="k")
+        assert groups.get("k_count", 1) == 2
+
+
+def best_time(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func, arg):
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(nrow, ncol, types, repeat, layouts=None):
+    columns = make_columns(nrow, ncol, types)
+    results = []
+    for (layout, (prepare, build)) in LAYOUTS.items():
+        if layouts and layout not in layouts:
+            continue
+        prepared = prepare(columns)
+        results.append(measure(layout, "construct", build, prepared, repeat))
+        # Prepare twice so `eq` cannot succeed just because both frames
+        # hold the very same row objects.
+        pair = (build(prepared), build(prepare(columns)))
+        for (name, op) in operations(columns):
+            results.append(measure(layout, name, op, pair, repeat))
+    return {
+        "config": {"rows": nrow, "cols": ncol, "types": types, "repeat": repeat},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def measure(layout, name, op, arg, repeat):
+    return {
+        "layout": layout,
+        "op": name,
+        "seconds": best_time(op, arg, repeat),
+        "peak_bytes": peak_memory(op, arg),
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return a message for each result that is worse than its baseline"""
+    old = {(r["layout"], r["op"]): r for r in baseline["results"]}
+    problems = []
+    for r in current["results"]:
+        before = old.get((r["layout"], r["op"]))
+        if before is None:
+            continue
+        for key in ("seconds", "peak_bytes"):
+            if before[key] and r[key] > before[key] * threshold:
+                problems.append(
+                    f"{r['layout']} {r['op']}: {key} {before[key]:.6g} -> {r[key]:.6g}"
+                )
+    return problems
+
+
+def report(data):
+    for r in data["results"]:
+        print(f"{r['layout']:12} {r['op']:12} {r['seconds'] * 1e3:10.3f} ms "
+              f"{r['peak_bytes'] / 1e6:10.3f} MB")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cols", type=int, default=6)
+    parser.add_argument("--types", default="int,float,str,bool")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--layouts", help="comma-separated subset of " + ",".join(LAYOUTS))
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--compare", help="JSON results to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    options = parser.parse_args(args)
+
+    types = options.types.split(",")
+    assert all(t in GENERATORS for t in types), f"Types must be among {list(GENERATORS)}"
+    layouts = options.layouts.split(",") if options.layouts else None
+    check_left_join()
+    data = run(options.rows, options.cols, types, options.repeat, layouts)
+    report(data)
+
+    if options.output:
+        with open(options.output, "w") as writer:
+            json.dump(data, writer, indent=2)
+    if options.compare:
+        with open(options.compare, "r") as reader:
+            problems = compare(data, json.load(reader), options.threshold)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+import array
+import csv
+import itertools
+import json
+import mmap
+import sys
+
+from Using_arrays import (TYPECODES, BoolColumn, ChunkedColumn, DictColumn, StrColumn,
+                          make_column, worth_encoding)
+
+BOOLEANS = {"True": True, "False": False}
+NUMERIC_KINDS = {"int": int, "float": float}
+
+# Binary layout: MAGIC, an 8-byte little-endian header length, the JSON
+# header, then every column buffer, each starting on an 8-byte boundary.
+MAGIC = b"DFCOL\x01"
+ALIGN = 8
+
+
+def read_csv(path, chunk_rows=65536):
+    """Read a CSV file into typed columns, `chunk_rows` rows at a time.
+
+    Each column's type is guessed from the first chunk (int, then float,
+    then bool, then str). Later chunks are parsed straight into the same
+    buffer; an int column that meets a float is widened to float.
+    """
+    assert chunk_rows > 0
+    with open(path, newline="") as reader:
+        rows = csv.reader(reader)
+        names = next(rows)
+        assert len(set(names)) == len(names), "Duplicate column names"
+        columns = None
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            assert all(len(r) == len(names) for r in chunk), "Ragged CSV rows"
+            values = list(zip(*chunk))
+            if columns is None:
+                columns = [start_column(v) for v in values]
+            else:
+                columns = [append_column(c, v) for (c, v) in zip(columns, values)]
+    if columns is None:
+        columns = [StrColumn() for _ in names]
+    return dict(zip(names, columns))
+
+
+def start_column(text):
+    """Build a column from the first chunk of text values, guessing its type"""
+    try:
+        # Ints too big for 64 bits stay exact in a list, as make_column does.
+        return make_column(int, list(map(int, text)))
+    except ValueError:
+        pass
+    try:
+        return array.array(TYPECODES[float], map(float, text))
+    except ValueError:
+        pass
+    if all(t in BOOLEANS for t in text):
+        return BoolColumn(map(BOOLEANS.__getitem__, text))
+    return make_column(str, text)
+
+
+def append_column(column, text):
+    """Parse text values into an existing column, widening its type if needed.
+
+    An int column that meets a float becomes a float column, and one that
+    meets an int too big for 64 bits becomes a list that keeps every int
+    exact. A numeric or bool column that meets text it cannot parse (an
+    empty field, say) becomes a str column, holding the earlier values as
+    `str()` gives them. A dictionary-encoded column whose values stop
+    repeating often enough becomes a plain str column.
+    """
+    if isinstance(column, StrColumn):
+        column.extend(text)
+        return column
+    if isinstance(column, DictColumn):
+        column.extend(text)
+        # Values that stop repeating no longer pay for the dictionary.
+        if not worth_encoding(len(column.dictionary), len(column)):
+            return StrColumn(column)
+        return column
+    if isinstance(column, BoolColumn):
+        if all(t in BOOLEANS for t in text):
+            column.extend(map(BOOLEANS.__getitem__, text))
+            return column
+        return as_text(column, text)
+    # Parse the whole chunk before touching the column, so a failure
+    # part of the way through leaves it unchanged.
+    if isinstance(column, list) or column.typecode == TYPECODES[int]:
+        try:
+            ints = list(map(int, text))
+        except ValueError:
+            ints = None
+        if ints is not None:
+            if isinstance(column, list):
+                column.extend(ints)
+                return column
+            try:
+                column.extend(array.array(column.typecode, ints))
+            except OverflowError:
+                column = list(column)
+                column.extend(ints)
+            return column
+    try:
+        floats = list(map(float, text))
+    except ValueError:
+        return as_text(column, text)
+    if isinstance(column, list):
+        # Widening exact big ints to float would lose them; keep the list.
+        column.extend(floats)
+        return column
+    if column.typecode != TYPECODES[float]:
+        column = array.array(TYPECODES[float], column)
+    column.extend(floats)
+    return column
+
+
+def as_text(column, text):
+    """Re-encode a typed column as strings and append more text to it"""
+    return make_column(str, list(map(str, column)) + list(text))
+
+
+def write_binary(columns, nrow, path):
+    """Write typed columns with a JSON header that says where each buffer is"""
+    header = {"byteorder": sys.byteorder, "nrow": nrow, "columns": []}
+    buffers = []
+    position = 0
+    for (name, column) in columns.items():
+        if isinstance(column, ChunkedColumn):
+            column = column.flatten()
+        if isinstance(column, StrColumn):
+            (kind, parts) = ("str", [memoryview(column.offsets).cast("B"), column.buffer])
+        elif isinstance(column, DictColumn):
+            (kind, parts) = ("dict", [memoryview(column.codes).cast("B")])
+        elif isinstance(column, BoolColumn):
+            (kind, parts) = ("bool", [memoryview(column).cast("B")])
+        elif isinstance(column, array.array):
+            kind = "int" if column.typecode == TYPECODES[int] else "float"
+            parts = [memoryview(column).cast("B")]
+        else:
+            assert False, f"Column {name} holds Python objects and cannot be saved"
+        spans = []
+        for part in parts:
+            spans.append([position, len(part)])
+            buffers.append(part)
+            position = aligned(position + len(part))
+        entry = {"name": name, "kind": kind, "spans": spans}
+        if kind == "dict":
+            entry["typecode"] = column.codes.typecode
+            entry["dictionary"] = list(column.dictionary)
+        header["columns"].append(entry)
+
+    encoded = json.dumps(header).encode()
+    with open(path, "wb") as writer:
+        writer.write(MAGIC)
+        writer.write(len(encoded).to_bytes(8, "little"))
+        writer.write(encoded)
+        writer.write(bytes(aligned(writer.tell()) - writer.tell()))
+        for part in buffers:
+            writer.write(part)
+            writer.write(bytes(aligned(len(part)) - len(part)))
+
+
+def read_binary(path):
+    """Map a file written by write_binary and copy each buffer into a column"""
+    with open(path, "rb") as reader:
+        with mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return read_columns(view)
+            finally:
+                view.release()
+
+
+def read_columns(view):
+    assert view[:len(MAGIC)] == MAGIC, "Not a binary column file"
+    start = len(MAGIC) + 8
+    length = int.from_bytes(view[len(MAGIC):start], "little")
+    header = json.loads(bytes(view[start:start + length]))
+    base = aligned(start + length)
+    swap = header["byteorder"] != sys.byteorder
+
+    columns = {}
+    for entry in header["columns"]:
+        parts = [view[base + offset:base + offset + size]
+                 for (offset, size) in entry["spans"]]
+        kind = entry["kind"]
+        if kind == "str":
+            column = StrColumn()
+            column.offsets = array.array("q")
+            column.offsets.frombytes(parts[0])
+            column.buffer = bytes(parts[1])
+            if swap:
+                column.offsets.byteswap()
+        elif kind == "dict":
+            column = DictColumn(array.array(entry["typecode"]), tuple(entry["dictionary"]))
+            column.codes.frombytes(parts[0])
+            if swap:
+                column.codes.byteswap()
+        else:
+            column = BoolColumn() if kind == "bool" else array.array(TYPECODES[NUMERIC_KINDS[kind]])
+            column.frombytes(parts[0])
+            if swap:
+                column.byteswap()
+        for part in parts:
+            part.release()
+        assert len(column) == header["nrow"], f"Column {entry['name']} has the wrong length"
+        columns[entry["name"]] = column
+    return columns
+
+
+def aligned(position):
+    return -(-position // ALIGN) * ALIGN
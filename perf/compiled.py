@@ -0,0 +1,28 @@
+TEMPLATE = """def run(rows{params}):
+    return [row for row in rows if {test}]
+"""
+
+# Generated functions keyed by (test source, frozenset of column names).
+_CACHE = {}
+
+
+def compile_filter(expr, columns):
+    """Return a function that filters a list of row dicts by `expr`.
+
+    The generated code reads only the keys `expr` refers to and runs the
+    test inline in a list comprehension, so no function is called per row.
+    Functions are cached by the shape of the expression and the schema;
+    constants are passed in as arguments, so `col("a") > 3` and
+    `col("a") > 4` share one function.
+    """
+    assert expr.columns() <= set(columns)
+    constants = []
+    test = expr.source(constants)
+    key = (test, frozenset(columns))
+    if key not in _CACHE:
+        params = "".join(f", c{i}" for i in range(len(constants)))
+        namespace = {}
+        exec(TEMPLATE.format(params=params, test=test), namespace)
+        _CACHE[key] = namespace["run"]
+    run = _CACHE[key]
+    return lambda rows: run(rows, *constants)
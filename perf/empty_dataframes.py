@@ -1,3 +1,11 @@
+import itertools
+import operator
+
+from compiled import compile_filter
+from expressions import Expr
+from indexes import build_index, index_lookup
+from lazy import LazyFrame
+
 class DataFrame:
     def ncol(self):
         """Report the number of columns"""
@@ -20,6 +28,16 @@ class DataFrame:
     def filter(self, func):
         """Selecte a subset of rows be testing values"""
 
+    def to_rows(self):
+        """Return the same data as a row-oriented DfRow"""
+
+    def to_columns(self):
+        """Return the same data as a column-oriented DfCol"""
+
+    def lazy(self):
+        """Start a query plan that only runs when collected"""
+        return LazyFrame(self)
+
 def dict_match(d, prototype):
     if set(d.keys()) != set(prototype.keys()):
         return False
@@ -31,12 +49,39 @@ def check_empty_RowDf(rows):
         result.append(all([type(row[col]) == None for col in row]))
     return all(result)
 
+def share_strings(rows):
+    """Make equal strings in each column one object, so a column with few
+    distinct values holds only that many strings however long it is.
+
+    This changes the rows in place, so only use it on rows built here.
+    """
+    if not rows:
+        return
+    for key in [k for k in rows[0] if type(rows[0][k]) == str]:
+        canonical = {}
+        for r in rows:
+            r[key] = canonical.setdefault(r[key], r[key])
+
 class DfRow(DataFrame):
     def __init__(self,rows):
         assert len(rows) > 0
         if not check_empty_RowDf(rows):
             assert all(dict_match(r, rows[0]) for r in rows)
         self._data = rows
+        self._indexes = {}
+
+    @classmethod
+    def _from_rows(cls, rows):
+        """Wrap rows that are already known to match each other"""
+        df = cls.__new__(cls)
+        df._data = rows
+        df._indexes = {}
+        return df
+
+    def create_index(self, col, kind="hash"):
+        """Index a column so filters comparing it to constants skip the scan"""
+        assert col in self._data[0]
+        self._indexes[col] = build_index(kind, map(operator.itemgetter(col), self._data))
 
     def ncols(self):
         return len(self._data[0])
@@ -54,6 +99,8 @@ class DfRow(DataFrame):
     
     def eq(self, other):
         assert isinstance(other, DataFrame)
+        if isinstance(other, DfRow) and self.cols() == other.cols():
+            return self._data == other._data
         for (i, row) in enumerate(self._data):
             for key in row:
                 if key not in other.cols():
@@ -65,11 +112,47 @@ class DfRow(DataFrame):
     def select(self, *names):
         assert all(n in self._data[0] for n in names)
         rows =[{key:r[key] for key in names} for r in self._data]
-        return DfRow(rows)
+        result = DfRow(rows)
+        result._indexes = {n: ix for (n, ix) in self._indexes.items() if n in names}
+        return result
     
-    def filter(self, func):
+    def filter(self, func, compiled=False):
+        """Keep the rows that pass func.
+
+        With `compiled=True` an expression is turned into a generated
+        function that reads only the keys it needs; see compile_filter.
+        """
+        if isinstance(func, Expr):
+            assert func.columns() <= self.cols()
+            found = index_lookup(func, self._indexes)
+            if found is not None:
+                (positions, rest) = found
+                narrowed = DfRow._from_rows(list(map(self._data.__getitem__, positions)))
+                return narrowed if rest is None else narrowed.filter(rest, compiled)
+            if compiled:
+                return DfRow._from_rows(compile_filter(func, self.cols())(self._data))
+            lookup = lambda name: map(operator.itemgetter(name), self._data)
+            mask = func.mask(lookup, self.nrow())
+            return DfRow._from_rows(list(itertools.compress(self._data, mask)))
         result = [r for r in self._data if func(**r)]
         return DfRow(result)
     
+    def join(self, other, on, how="inner"):
+        """Join with another frame on equal values of the `on` column(s)"""
+        # The join itself is columnar; only the result is turned back into rows.
+        return self.to_columns().join(other, on, how).to_rows()
+
+    def to_rows(self):
+        return self
+
+    def to_columns(self):
+        # Imported here because Using_arrays builds on this module.
+        from Using_arrays import DfCol, make_column
+        first = self._data[0]
+        return DfCol._from_columns({
+            n: make_column(type(first[n]), list(map(operator.itemgetter(n), self._data)))
+            for n in first
+        })
+
     def __str__(self):
         return str(self._data)
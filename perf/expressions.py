@@ -0,0 +1,236 @@
+import operator
+from itertools import repeat
+
+
+class Expr:
+    """Base class for expressions evaluated a whole column at a time"""
+    # Comparisons build expressions instead of returning a bool, so keep
+    # expressions hashable by identity.
+    __hash__ = object.__hash__
+
+    # True if evaluating the expression always produces booleans.
+    is_predicate = False
+
+    def __bool__(self):
+        raise TypeError("Use &, | and ~ to combine expressions, not and/or/not")
+
+    def columns(self):
+        """Return the set of column names the expression reads"""
+        raise NotImplementedError
+
+    def evaluate(self, lookup, nrow):
+        """Return an iterable of nrow values, reading columns with lookup(name)"""
+        raise NotImplementedError
+
+    def source(self, constants):
+        """Return Python source evaluating the expression for one `row` dict.
+
+        Constants are appended to `constants` and referred to as c0, c1, ...
+        so the same source serves every value of them.
+        """
+        raise NotImplementedError
+
+    def mask(self, lookup, nrow):
+        """Evaluate as a predicate, one byte per row"""
+        values = self.evaluate(lookup, nrow)
+        if not self.is_predicate:
+            values = map(operator.truth, values)
+        return bytes(values)
+
+    def __eq__(self, other):
+        return Compare(operator.eq, "==", self, wrap(other))
+
+    def __ne__(self, other):
+        return Compare(operator.ne, "!=", self, wrap(other))
+
+    def __lt__(self, other):
+        return Compare(operator.lt, "<", self, wrap(other))
+
+    def __le__(self, other):
+        return Compare(operator.le, "<=", self, wrap(other))
+
+    def __gt__(self, other):
+        return Compare(operator.gt, ">", self, wrap(other))
+
+    def __ge__(self, other):
+        return Compare(operator.ge, ">=", self, wrap(other))
+
+    def __and__(self, other):
+        return Logical(operator.and_, "&", self, wrap(other))
+
+    def __rand__(self, other):
+        return Logical(operator.and_, "&", wrap(other), self)
+
+    def __or__(self, other):
+        return Logical(operator.or_, "|", self, wrap(other))
+
+    def __ror__(self, other):
+        return Logical(operator.or_, "|", wrap(other), self)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __add__(self, other):
+        return BinOp(operator.add, "+", self, wrap(other))
+
+    def __radd__(self, other):
+        return BinOp(operator.add, "+", wrap(other), self)
+
+    def __sub__(self, other):
+        return BinOp(operator.sub, "-", self, wrap(other))
+
+    def __rsub__(self, other):
+        return BinOp(operator.sub, "-", wrap(other), self)
+
+    def __mul__(self, other):
+        return BinOp(operator.mul, "*", self, wrap(other))
+
+    def __rmul__(self, other):
+        return BinOp(operator.mul, "*", wrap(other), self)
+
+    def __truediv__(self, other):
+        return BinOp(operator.truediv, "/", self, wrap(other))
+
+    def __rtruediv__(self, other):
+        return BinOp(operator.truediv, "/", wrap(other), self)
+
+    def __floordiv__(self, other):
+        return BinOp(operator.floordiv, "//", self, wrap(other))
+
+    def __rfloordiv__(self, other):
+        return BinOp(operator.floordiv, "//", wrap(other), self)
+
+    def __mod__(self, other):
+        return BinOp(operator.mod, "%", self, wrap(other))
+
+    def __rmod__(self, other):
+        return BinOp(operator.mod, "%", wrap(other), self)
+
+    def __neg__(self):
+        return BinOp(operator.sub, "-", Literal(0), self)
+
+
+class Col(Expr):
+    """A reference to a named column"""
+    def __init__(self, name):
+        self.name = name
+
+    def columns(self):
+        return {self.name}
+
+    def evaluate(self, lookup, nrow):
+        return lookup(self.name)
+
+    def source(self, constants):
+        return f"row[{self.name!r}]"
+
+    def __repr__(self):
+        return f"col({self.name!r})"
+
+
+class Literal(Expr):
+    """A constant, repeated once per row"""
+    def __init__(self, value):
+        self.value = value
+        self.is_predicate = isinstance(value, bool)
+
+    def columns(self):
+        return set()
+
+    def evaluate(self, lookup, nrow):
+        return repeat(self.value, nrow)
+
+    def source(self, constants):
+        constants.append(self.value)
+        return f"c{len(constants) - 1}"
+
+    def __repr__(self):
+        return f"lit({self.value!r})"
+
+
+class BinOp(Expr):
+    """Apply a binary operator element by element"""
+    def __init__(self, op, symbol, left, right):
+        self.op = op
+        self.symbol = symbol
+        self.left = left
+        self.right = right
+
+    def columns(self):
+        return self.left.columns() | self.right.columns()
+
+    def evaluate(self, lookup, nrow):
+        # `map` over two iterables keeps the per-row work inside C, and
+        # chaining maps means no intermediate column is ever built.
+        return map(self.op, self.left.evaluate(lookup, nrow),
+                   self.right.evaluate(lookup, nrow))
+
+    def source(self, constants):
+        return f"({self.left.source(constants)} {self.symbol} {self.right.source(constants)})"
+
+    def __repr__(self):
+        return f"({self.left!r} {self.symbol} {self.right!r})"
+
+
+class Compare(BinOp):
+    is_predicate = True
+
+    def evaluate(self, lookup, nrow):
+        # A column may compare itself with a constant faster than value by
+        # value, e.g. a dictionary-encoded column comparing codes.
+        if self.symbol in ("==", "!="):
+            (left, right) = (self.left, self.right)
+            if isinstance(left, Literal):
+                (left, right) = (right, left)
+            if isinstance(left, Col) and isinstance(right, Literal):
+                column = lookup(left.name)
+                compare = getattr(column, "compare_constant", None)
+                result = compare(self.op, right.value) if compare else None
+                if result is not None:
+                    return result
+                return map(self.op, column, repeat(right.value, nrow))
+        return super().evaluate(lookup, nrow)
+
+
+class Logical(BinOp):
+    def __init__(self, op, symbol, left, right):
+        super().__init__(op, symbol, left, right)
+        self.is_predicate = left.is_predicate and right.is_predicate
+
+    def source(self, constants):
+        # Between booleans, `and`/`or` give the same answer and can stop early.
+        if not self.is_predicate:
+            return super().source(constants)
+        keyword = "and" if self.symbol == "&" else "or"
+        return f"({self.left.source(constants)} {keyword} {self.right.source(constants)})"
+
+
+class Not(Expr):
+    is_predicate = True
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    def columns(self):
+        return self.operand.columns()
+
+    def evaluate(self, lookup, nrow):
+        return map(operator.not_, self.operand.evaluate(lookup, nrow))
+
+    def source(self, constants):
+        return f"(not {self.operand.source(constants)})"
+
+    def __repr__(self):
+        return f"~{self.operand!r}"
+
+
+def col(name):
+    return Col(name)
+
+
+def lit(value):
+    return Literal(value)
+
+
+def wrap(value):
+    return value if isinstance(value, Expr) else Literal(value)
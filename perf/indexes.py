@@ -0,0 +1,112 @@
+import array
+import bisect
+from collections import defaultdict
+
+from expressions import Col, Compare, Literal, Logical
+
+
+class HashIndex:
+    """Map each value of a column to the rows that hold it"""
+    def __init__(self, values):
+        positions = defaultdict(list)
+        for (i, v) in enumerate(values):
+            positions[v].append(i)
+        self._positions = dict(positions)
+
+    def equal(self, value):
+        return self._positions.get(value, [])
+
+    def groups(self):
+        """Return a dict from each distinct value to its rows, in first-seen order"""
+        return self._positions
+
+
+class SortedIndex:
+    """Keep the rows of a column in value order for equality and range lookups"""
+    def __init__(self, values):
+        self._keys = list(values)
+        self._order = array.array("q", sorted(range(len(self._keys)),
+                                              key=self._keys.__getitem__))
+        self._keys.sort()
+
+    def equal(self, value):
+        return self.between([(">=", value), ("<=", value)])
+
+    def between(self, bounds):
+        """Return the rows in row order that satisfy every (symbol, value) bound"""
+        start, end = 0, len(self._keys)
+        for (symbol, value) in bounds:
+            if symbol == ">":
+                start = max(start, bisect.bisect_right(self._keys, value))
+            elif symbol == ">=":
+                start = max(start, bisect.bisect_left(self._keys, value))
+            elif symbol == "<":
+                end = min(end, bisect.bisect_left(self._keys, value))
+            else:
+                end = min(end, bisect.bisect_right(self._keys, value))
+        return sorted(self._order[start:end]) if start < end else []
+
+
+INDEX_KINDS = {"hash": HashIndex, "sorted": SortedIndex}
+
+# How a comparison reads when its constant is moved to the right.
+FLIPPED = {"==": "==", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+def build_index(kind, values):
+    assert kind in INDEX_KINDS, f"Unknown index kind {kind}"
+    return INDEX_KINDS[kind](values)
+
+
+def index_lookup(expr, indexes):
+    """Use an index to answer part of a filter expression.
+
+    Returns `(positions, rest)`: the row numbers that pass the part of
+    `expr` answered by the index, in row order, and the rest of the
+    expression still to be checked on those rows (or None). Returns None
+    if no index applies.
+    """
+    terms = split_and(expr)
+    found = [(t, index_term(t, indexes)) for t in terms]
+    found = [(t, f) for (t, f) in found if f is not None]
+
+    equal = [(t, f) for (t, f) in found if f[1] == "=="]
+    if equal:
+        (term, (name, _, value)) = equal[0]
+        positions = indexes[name].equal(value)
+        used = [term]
+    else:
+        ranges = [(t, f) for (t, f) in found
+                  if isinstance(indexes[f[0]], SortedIndex)]
+        if not ranges:
+            return None
+        name = ranges[0][1][0]
+        used = [t for (t, f) in ranges if f[0] == name]
+        positions = indexes[name].between(
+            [(f[1], f[2]) for (t, f) in ranges if f[0] == name]
+        )
+
+    rest = None
+    for t in terms:
+        if not any(t is u for u in used):
+            rest = t if rest is None else rest & t
+    return positions, rest
+
+
+def split_and(expr):
+    """Break an expression into the terms that are joined by `&`"""
+    if isinstance(expr, Logical) and expr.symbol == "&":
+        return split_and(expr.left) + split_and(expr.right)
+    return [expr]
+
+
+def index_term(expr, indexes):
+    """Return (name, symbol, value) if expr compares an indexed column to a constant"""
+    if not isinstance(expr, Compare) or expr.symbol not in FLIPPED:
+        return None
+    (left, symbol, right) = (expr.left, expr.symbol, expr.right)
+    if isinstance(left, Literal):
+        (left, symbol, right) = (right, FLIPPED[symbol], left)
+    if isinstance(left, Col) and isinstance(right, Literal) and left.name in indexes:
+        return (left.name, symbol, right.value)
+    return None
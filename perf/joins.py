@@ -0,0 +1,51 @@
+import array
+from itertools import repeat
+
+from indexes import HashIndex
+
+JOIN_KINDS = ("inner", "left")
+
+
+def hash_join(left_keys, right_keys, how="inner"):
+    """Pair up the rows of two key sequences whose keys are equal.
+
+    The hash table is built on the shorter side and probed with the
+    longer one. Returns `(left_rows, right_rows)` as parallel arrays in
+    left row order; for a left join, `right_rows` holds -1 where a left
+    row has no match.
+    """
+    assert how in JOIN_KINDS, f"Unknown join kind {how}"
+    left_keys = list(left_keys)
+    right_keys = list(right_keys)
+    left_rows = array.array("q")
+    right_rows = array.array("q")
+
+    if len(right_keys) <= len(left_keys):
+        table = HashIndex(right_keys).groups()
+        for (i, key) in enumerate(left_keys):
+            matches = table.get(key)
+            if matches:
+                left_rows.extend(repeat(i, len(matches)))
+                right_rows.extend(matches)
+            elif how == "left":
+                left_rows.append(i)
+                right_rows.append(-1)
+        return left_rows, right_rows
+
+    table = HashIndex(left_keys).groups()
+    pairs = []
+    matched = set()
+    for (j, key) in enumerate(right_keys):
+        matches = table.get(key)
+        if matches:
+            pairs.extend(zip(matches, repeat(j)))
+            matched.add(key)
+    if how == "left":
+        for (key, rows) in table.items():
+            if key not in matched:
+                pairs.extend(zip(rows, repeat(-1)))
+    pairs.sort()
+    for (i, j) in pairs:
+        left_rows.append(i)
+        right_rows.append(j)
+    return left_rows, right_rows
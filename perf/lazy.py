@@ -0,0 +1,79 @@
+from expressions import Expr
+
+
+class LazyFrame:
+    """Record select and filter calls on a frame and run them on collect()"""
+    def __init__(self, source, steps=(), visible=None):
+        self._source = source
+        self._steps = tuple(steps)
+        # Columns a step at the end of the chain would see, in order.
+        self._visible = tuple(sorted(source.cols())) if visible is None else visible
+
+    def cols(self):
+        return set(self._visible)
+
+    def select(self, *names):
+        assert names
+        assert all(n in self._visible for n in names)
+        return LazyFrame(self._source, self._steps + (("select", names),), names)
+
+    def filter(self, func):
+        if isinstance(func, Expr):
+            assert func.columns() <= self.cols()
+        return LazyFrame(self._source, self._steps + (("filter", func, self._visible),),
+                         self._visible)
+
+    def plan(self):
+        """Return the optimized list of ("select", names) and ("filter", func) steps"""
+        return optimize(self._steps, self._source.cols(), self._visible)
+
+    def collect(self):
+        result = self._source
+        for step in self.plan():
+            if step[0] == "select":
+                result = result.select(*step[1])
+            else:
+                result = result.filter(step[1])
+        return result
+
+
+def optimize(steps, source_cols, final):
+    """Rewrite a chain of steps so that filters run first and columns are
+    gathered once at the end.
+
+    Expression filters only read the columns they name, so they all move
+    to the front and are joined with `&`. Callable filters are called with
+    every visible column as a keyword argument, so each one still needs the
+    select that came before it; consecutive callables that see the same
+    columns are merged into one.
+    """
+    exprs = [s[1] for s in steps if s[0] == "filter" and isinstance(s[1], Expr)]
+    plan = []
+    if exprs:
+        merged = exprs[0]
+        for e in exprs[1:]:
+            merged = merged & e
+        plan.append(("filter", merged))
+
+    current = set(source_cols)
+    for (kind, func, visible) in [s for s in steps if s[0] == "filter"]:
+        if isinstance(func, Expr):
+            continue
+        if set(visible) != current:
+            plan.append(("select", visible))
+            current = set(visible)
+        if plan and plan[-1][0] == "filter" and not isinstance(plan[-1][1], Expr):
+            plan[-1] = ("filter", all_of(plan[-1][1], func))
+        else:
+            plan.append(("filter", func))
+
+    if set(final) != current:
+        plan.append(("select", final))
+    return plan
+
+
+def all_of(*funcs):
+    """Combine row predicates so a row must pass every one of them"""
+    def merged(**row):
+        return all(f(**row) for f in funcs)
+    return merged
@@ -0,0 +1,132 @@
+import array
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from expressions import Expr
+from Using_arrays import BoolColumn, ChunkedColumn, DfCol, DictColumn, StrColumn
+
+
+def parallel_filter(frame, func, workers=None, chunk_rows=None):
+    """Filter a DfCol by running the predicate over row chunks in a process pool.
+
+    `func` is an expression or a picklable (module-level) function taking
+    the columns as keyword arguments. The columns the predicate reads are
+    copied once into shared memory; workers attach to those blocks and
+    only send back the numbers of the rows that passed, which are joined
+    in row order into a view of `frame`.
+    """
+    assert isinstance(frame, DfCol)
+    if isinstance(func, Expr):
+        assert func.columns() <= frame.cols()
+        names = sorted(func.columns())
+    else:
+        names = list(frame.cols())
+    nrow = frame.nrow()
+    workers = workers or os.cpu_count()
+    chunk_rows = chunk_rows or max(1, -(-nrow // workers))
+    starts = range(0, nrow, chunk_rows)
+    ends = [min(s + chunk_rows, nrow) for s in starts]
+
+    blocks = []
+    try:
+        specs = [share_column(n, frame._column(n), blocks) for n in names]
+        with ProcessPoolExecutor(workers) as pool:
+            tasks = [pool.submit(filter_chunk, chunk_specs(specs, s, e), func, s, e)
+                     for (s, e) in zip(starts, ends)]
+            positions = array.array("q")
+            for task in tasks:
+                positions.extend(task.result())
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    ids = frame._row_ids()
+    rows = array.array("q", map(ids.__getitem__, positions))
+    return DfCol._from_columns(frame._data, rows)
+
+
+def share_column(name, column, blocks):
+    """Copy a column into shared memory and describe how to read it back"""
+    if isinstance(column, ChunkedColumn):
+        column = column.flatten()
+    if isinstance(column, StrColumn):
+        offsets = to_shared(memoryview(column.offsets).cast("B"), blocks)
+        buffer = to_shared(column.buffer, blocks)
+        return ("str", name, offsets, buffer)
+    if isinstance(column, DictColumn):
+        # The dictionary is small, so it travels with the task.
+        codes = to_shared(memoryview(column.codes).cast("B"), blocks)
+        return ("dict", name, codes, column.codes.typecode, column.dictionary)
+    if isinstance(column, array.array):
+        kind = "bool" if isinstance(column, BoolColumn) else "array"
+        block = to_shared(memoryview(column).cast("B"), blocks)
+        return (kind, name, block, column.typecode)
+    # Python objects cannot live in shared memory, so they are pickled
+    # one chunk at a time instead.
+    return ("list", name, column)
+
+
+def to_shared(data, blocks):
+    block = SharedMemory(create=True, size=max(1, len(data)))
+    block.buf[:len(data)] = data
+    blocks.append(block)
+    return block.name
+
+
+def chunk_specs(specs, start, end):
+    """Cut the list columns down to one chunk before they are sent to a worker"""
+    return [spec if spec[0] != "list" else ("list", spec[1], spec[2][start:end])
+            for spec in specs]
+
+
+def filter_chunk(specs, func, start, end):
+    """Worker: return the numbers of the rows in [start, end) that pass func"""
+    attached = []
+    views = []
+    try:
+        columns = {spec[1]: read_chunk(spec, start, end, attached, views)
+                   for spec in specs}
+        if isinstance(func, Expr):
+            mask = func.mask(columns.__getitem__, end - start)
+        else:
+            names = list(columns)
+            rows = zip(*[columns[n] for n in names])
+            mask = bytes(bool(func(**dict(zip(names, r)))) for r in rows)
+        return array.array("q", itertools.compress(range(start, end), mask))
+    finally:
+        # Shared blocks cannot be closed while views into them are alive.
+        for view in reversed(views):
+            view.release()
+        for block in attached:
+            block.close()
+
+
+def read_chunk(spec, start, end, attached, views):
+    """Worker: return one chunk of a shared column as a sequence of values"""
+    kind = spec[0]
+    if kind == "list":
+        return spec[2]
+    if kind == "str":
+        offsets = attach(spec[2], attached).buf.cast("q")
+        buffer = attach(spec[3], attached).buf
+        views.append(offsets)
+        return [bytes(buffer[offsets[i]:offsets[i + 1]]).decode()
+                for i in range(start, end)]
+    view = attach(spec[2], attached).buf.cast(spec[3])
+    views.append(view)
+    chunk = view[start:end]
+    views.append(chunk)
+    if kind == "dict":
+        codes = array.array(spec[3])
+        codes.frombytes(chunk)
+        return DictColumn(codes, spec[4])
+    return list(map(bool, chunk)) if kind == "bool" else chunk
+
+
+def attach(name, attached):
+    block = SharedMemory(name=name)
+    attached.append(block)
+    return block